@@ -0,0 +1,98 @@
+"""
+Multi-threaded stress benchmark of territory lookups during reloads.
+
+Reader threads look territories up, lock-free, while a writer thread keeps
+reloading the registry. Each read takes one registry version and checks
+that it is consistent, a torn read would be e.g. Croatia by TIS-N and by
+TIS-A being different objects, or not being in the World of the version.
+
+Reader throughput is measured without and with reloads. Readers do not
+take locks, so with reloads they should lose at most the share of CPU
+taken by the writer thread, one of readers + 1 threads. The run fails on
+torn reads, or if the throughput ratio is below that share times the
+tolerance, which would mean contention.
+
+Run from the repository root:
+
+    python -m benchmarks.concurrency --readers 4 --seconds 2
+"""
+
+import argparse
+import sys
+import threading
+import time
+
+from music_metadata.territories.territory import (
+    Territory, reload_territories)
+
+
+def read(stop, results):
+    reads = torn = 0
+    while not stop.is_set():
+        registry = Territory.registry
+        croatia = registry.get('HR')
+        if (croatia is not registry.get('191') or
+                list(croatia.ascendants)[-1] is not registry.get('2136') or
+                Territory.get('us') is None):
+            torn += 1
+        reads += 1
+    results.append((reads, torn))
+
+
+def reload(stop, reloads):
+    while not stop.is_set():
+        reload_territories()
+        reloads.append(1)
+
+
+def stress(readers, seconds, reloading):
+    stop = threading.Event()
+    results = []
+    reloads = []
+    threads = [
+        threading.Thread(target=read, args=(stop, results))
+        for __ in range(readers)]
+    if reloading:
+        threads.append(threading.Thread(target=reload, args=(stop, reloads)))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    reads = sum(r for r, __ in results)
+    torn = sum(t for __, t in results)
+    return reads / seconds, torn, len(reloads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=2)
+    parser.add_argument('--tolerance', type=float, default=0.75)
+    args = parser.parse_args()
+
+    torn = 0
+    throughputs = []
+    for reloading in (False, True):
+        throughput, t, reloads = stress(
+            args.readers, args.seconds, reloading)
+        torn += t
+        throughputs.append(throughput)
+        print(f'{"with" if reloading else "without"} reloads: '
+              f'{throughput:>12.0f} reads/s, {t} torn reads, '
+              f'{reloads} reloads')
+    ratio = throughputs[1] / throughputs[0]
+    minimum = args.readers / (args.readers + 1) * args.tolerance
+    print(f'throughput ratio: {ratio:.2f} (minimum {minimum:.2f})')
+    if torn:
+        print('FAILED: torn reads')
+        return 1
+    if ratio < minimum:
+        print('FAILED: readers are slowed down by reloads')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+"""
+Differential run of TerritoryList against the reference implementation.
+
+Prints mismatches, if any, and the throughput of both engines on the same
+random workloads. Exits with a non-zero status on mismatches.
+
+Run from the repository root:
+
+    python -m benchmarks.differential --seeds 2000 --length 20
+"""
+
+import argparse
+import sys
+
+from music_metadata.territories.differential import compare
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--seeds', type=int, default=1000)
+    parser.add_argument('--length', type=int, default=20)
+    args = parser.parse_args()
+
+    report = compare(seeds=range(args.seeds), length=args.length)
+    for seed, operations, expected, actual in report.mismatches:
+        print(f'seed {seed}: {operations}')
+        print(f'    expected: {expected}')
+        print(f'    actual:   {actual}')
+    print(f'{report.operations} operations, '
+          f'{len(report.mismatches)} mismatching sequences')
+    print(f'reference: {report.reference_throughput:>12.0f} ops/s')
+    print(f'engine:    {report.engine_throughput:>12.0f} ops/s')
+    return 1 if report.mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
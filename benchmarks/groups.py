@@ -0,0 +1,60 @@
+"""
+Benchmarks for operations with groups outside the world tree.
+
+Groups such as COMMONWEALTH (2114) or EUROPEAN ECONOMIC AREA (2121) are
+expanded to their member countries by TerritoryList, so these operations
+are proportional to the number of members.
+
+Run from the repository root:
+
+    python -m benchmarks.groups
+"""
+
+import timeit
+
+from music_metadata.territories.territory import Territory
+from music_metadata.territories.territory_list import TerritoryList
+
+GROUPS = ['2114', '2121', '2123', '2104', '2108']
+
+
+def include(group):
+    territory_list = TerritoryList()
+    territory_list.include(group, 1)
+
+
+def world_exclude(group):
+    territory_list = TerritoryList()
+    territory_list.include('2136', 1)
+    territory_list.exclude(group)
+
+
+def world_add(group):
+    territory_list = TerritoryList()
+    territory_list.include('2136', 1)
+    territory_list.add(group, 1)
+
+
+def world_exclude_include(group):
+    territory_list = TerritoryList()
+    territory_list.include('2136', 1)
+    territory_list.exclude(group)
+    territory_list.include(group, 2)
+
+
+BENCHMARKS = [include, world_exclude, world_add, world_exclude_include]
+
+
+def main(number=200):
+    for code in GROUPS:
+        group = Territory.get(code)
+        print(f'{group.name} ({len(group.children)} members)')
+        for benchmark in BENCHMARKS:
+            seconds = min(timeit.repeat(
+                lambda: benchmark(group), number=number, repeat=3))
+            print(f'    {benchmark.__name__:<24}'
+                  f'{seconds / number * 1e6:>10.1f} us')
+
+
+if __name__ == '__main__':
+    main()
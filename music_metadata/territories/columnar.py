@@ -0,0 +1,214 @@
+"""
+Columnar export of expanded territory coverage.
+
+Analytics code often needs the country coverage of many territory lists
+as columns, e.g. in NumPy arrays or an Arrow table. Here, the coverage is
+written straight into column buffers, without creating a dictionary per
+row, and in chunks of bounded size, so exports of millions of lists do not
+need to fit in memory.
+
+Columns, one row per included country:
+
+* list_id - position of the territory list in the input
+* ordinal - position of the country in the territory registry (list.csv)
+* tis_n - numeric TIS code, e.g. 191
+* tis_a - alphanumeric TIS code, e.g. HR
+* value - object stored in the territory list for the country
+
+NumPy and PyArrow are optional, they are imported only when used.
+"""
+
+import array
+
+COLUMNS = ('list_id', 'ordinal', 'tis_n', 'tis_a', 'value')
+DEFAULT_CHUNK_SIZE = 65536
+
+
+def _new_chunk():
+    return {
+        'list_id': array.array('q'),
+        'ordinal': array.array('i'),
+        'tis_n': array.array('i'),
+        'tis_a': [],
+        'value': [],
+    }
+
+
+def _expand(territory):
+    """
+    Return column slices for all countries included in the territory.
+    """
+    if territory.is_country:
+        countries = [territory]
+    else:
+        countries = list(territory.countries)
+    return (
+        array.array('i', [c.ordinal for c in countries]),
+        array.array('i', [int(c.tis_n) for c in countries]),
+        [c.tis_a for c in countries],
+    )
+
+
+def iter_chunks(territory_lists, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Export expanded coverage of territory lists in chunks.
+
+    Args:
+        territory_lists (iterable): TerritoryList objects, may be a generator
+        chunk_size (int): maximum number of rows in a chunk
+
+    Returns:
+        generator of dicts with column names as keys and buffers as values,
+        array.array for numeric columns and list for others
+    """
+    if not isinstance(chunk_size, int) or chunk_size < 1:
+        raise ValueError('Chunk size must be a positive integer.')
+
+    expanded = {}
+    chunk = _new_chunk()
+    size = 0
+    for list_id, territory_list in enumerate(territory_lists):
+        for territory, obj in territory_list.items():
+            columns = expanded.get(territory)
+            if columns is None:
+                columns = expanded[territory] = _expand(territory)
+            ords, tis_ns, tis_as = columns
+            start = 0
+            total = len(tis_as)
+            while start < total:
+                end = min(total, start + chunk_size - size)
+                count = end - start
+                chunk['list_id'].extend(array.array('q', [list_id]) * count)
+                chunk['ordinal'].extend(ords[start:end])
+                chunk['tis_n'].extend(tis_ns[start:end])
+                chunk['tis_a'].extend(tis_as[start:end])
+                chunk['value'].extend([obj] * count)
+                size += count
+                start = end
+                if size == chunk_size:
+                    yield chunk
+                    chunk = _new_chunk()
+                    size = 0
+    if size:
+        yield chunk
+
+
+def iter_numpy_chunks(territory_lists, chunk_size=DEFAULT_CHUNK_SIZE,
+                      value_dtype=None):
+    """
+    Export expanded coverage of territory lists in chunks of NumPy arrays.
+
+    Numeric columns share memory with the chunk buffers. The value column
+    is one-dimensional, one object per row, unless a dtype is given, e.g.
+    float for numeric shares.
+
+    Args:
+        territory_lists (iterable): TerritoryList objects, may be a generator
+        chunk_size (int): maximum number of rows in a chunk
+        value_dtype (numpy.dtype): dtype of the value column, default object
+
+    Returns:
+        generator of dicts with column names as keys and arrays as values
+    """
+    import numpy
+
+    for chunk in iter_chunks(territory_lists, chunk_size):
+        values = chunk['value']
+        if value_dtype is None:
+            values = numpy.fromiter(values, dtype=object, count=len(values))
+        else:
+            values = numpy.asarray(values, dtype=value_dtype)
+        yield {
+            'list_id': numpy.frombuffer(chunk['list_id'], dtype=numpy.int64),
+            'ordinal': numpy.frombuffer(chunk['ordinal'], dtype=numpy.intc),
+            'tis_n': numpy.frombuffer(chunk['tis_n'], dtype=numpy.intc),
+            'tis_a': numpy.array(chunk['tis_a'], dtype=str),
+            'value': values,
+        }
+
+
+def _arrow_array(pyarrow, buffer, typ):
+    return pyarrow.Array.from_buffers(
+        typ, len(buffer), [None, pyarrow.py_buffer(buffer)])
+
+
+def iter_record_batches(territory_lists, chunk_size=DEFAULT_CHUNK_SIZE,
+                        value_type=None):
+    """
+    Export expanded coverage of territory lists in Arrow record batches.
+
+    Suitable for streaming, e.g. with pyarrow.parquet.ParquetWriter. Without
+    a value type, it is inferred for each batch, e.g. null for a batch with
+    only None values, so pass it when all batches must share one schema.
+
+    Args:
+        territory_lists (iterable): TerritoryList objects, may be a generator
+        chunk_size (int): maximum number of rows in a batch
+        value_type (pyarrow.DataType): type of the value column
+
+    Returns:
+        generator of pyarrow.RecordBatch objects
+    """
+    import pyarrow
+
+    for chunk in iter_chunks(territory_lists, chunk_size):
+        yield pyarrow.record_batch([
+            _arrow_array(pyarrow, chunk['list_id'], pyarrow.int64()),
+            _arrow_array(pyarrow, chunk['ordinal'], pyarrow.int32()),
+            _arrow_array(pyarrow, chunk['tis_n'], pyarrow.int32()),
+            pyarrow.array(chunk['tis_a'], type=pyarrow.string()),
+            pyarrow.array(chunk['value'], type=value_type),
+        ], names=COLUMNS)
+
+
+def _unify_values(pyarrow, batches):
+    """
+    Cast value columns with only nulls to the type of the other batches.
+    """
+    null = pyarrow.null()
+    index = COLUMNS.index('value')
+    types = set(batch.schema.field(index).type for batch in batches)
+    types.discard(null)
+    if len(types) > 1:
+        raise ValueError(
+            'Values are of different types, value type must be set.')
+    if not types:
+        return batches
+    value_type = types.pop()
+    return [
+        batch.set_column(
+            index, 'value', pyarrow.nulls(batch.num_rows, value_type))
+        if batch.schema.field(index).type == null else batch
+        for batch in batches]
+
+
+def to_arrow_table(territory_lists, chunk_size=DEFAULT_CHUNK_SIZE,
+                   value_type=None):
+    """
+    Export expanded coverage of territory lists to an Arrow table.
+
+    Without a value type, it is inferred from all values.
+
+    Args:
+        territory_lists (iterable): TerritoryList objects, may be a generator
+        chunk_size (int): maximum number of rows in a table chunk
+        value_type (pyarrow.DataType): type of the value column
+
+    Returns:
+        pyarrow.Table
+    """
+    import pyarrow
+
+    batches = list(
+        iter_record_batches(territory_lists, chunk_size, value_type))
+    if value_type is None:
+        batches = _unify_values(pyarrow, batches)
+    if batches:
+        return pyarrow.Table.from_batches(batches)
+    return pyarrow.table({
+        'list_id': pyarrow.array([], type=pyarrow.int64()),
+        'ordinal': pyarrow.array([], type=pyarrow.int32()),
+        'tis_n': pyarrow.array([], type=pyarrow.int32()),
+        'tis_a': pyarrow.array([], type=pyarrow.string()),
+        'value': pyarrow.array([], type=value_type or pyarrow.null()),
+    })
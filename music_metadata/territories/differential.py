@@ -0,0 +1,368 @@
+"""
+Differential testing of TerritoryList engines.
+
+Any optimised engine behind TerritoryList must give exactly the same results
+as the reference implementation, including the errors. Random sequences of
+operations over the real territory registry are run against both, and the
+resulting country coverage, values and exceptions are compared. Time spent
+in each engine is recorded, so performance is measured on the same
+workloads.
+
+Example:
+
+    report = compare(TerritoryList, seeds=range(1000))
+    assert not report.mismatches
+    print(report.reference_throughput, report.engine_throughput)
+
+"""
+
+import collections
+import random
+import time
+from collections import OrderedDict, defaultdict
+
+from .territory import Territory
+from .territory_list import TerritoryList
+
+OPERATIONS = ('include', 'exclude', 'add', 'compress')
+WEIGHTS = (4, 3, 4, 1)
+VALUES = (None, 10, 25, 50)
+
+
+class ReferenceTerritoryList(collections.OrderedDict):
+    """Reference implementation of TerritoryList.
+
+    This is the original, straightforward implementation, kept unchanged as
+    the specification for optimised engines. Do not optimise it."""
+
+    @staticmethod
+    def _clean_territory(territory):
+        if isinstance(territory, Territory):
+            return territory
+        if isinstance(territory, str):
+            return Territory.get(territory)
+        raise ValueError('Territory must be a Territory or a str.')
+
+    def __contains__(self, territory):
+        territory = self._clean_territory(territory)
+        if super().__contains__(territory):
+            return True
+        if any([territory in t.descendants for t in self.keys()]):
+            return True
+        return False
+
+    def include(self, territory, obj=None):
+        """
+        Include a territory with its data to the list.
+
+        Args:
+            territory (Territory): territory object to be included
+            obj (any): Any object, used in code that uses this functionality
+        """
+
+        territory = self._clean_territory(territory)
+
+        if territory in self.keys():
+            raise ValueError(
+                f'Territory {territory} is already directly included.')
+
+        if territory.children and not territory.in_world_tree:
+            # This is some group not in the world tree:
+            for t in territory.children:
+                self.include(t, obj)
+            return
+
+        for t in self:
+            if territory in t.descendants:
+                raise ValueError(
+                    f'Territory {territory} is already included through '
+                    f'{t}.')
+
+        for t in self:
+            if territory in t.ascendants:
+                raise ValueError(
+                    f'Territory {territory} already contains '
+                    f'{t}.')
+
+        self[territory] = obj
+
+    def exclude(self, territory):
+        """
+        Smartly exclude the territory from the list
+
+        Args:
+            territory (Territory): territory object to be excluded
+        """
+
+        territory = self._clean_territory(territory)
+
+        # Let's try the trivial version
+        if territory in self.keys():
+            del self[territory]
+            return
+
+        # If it is some non-world-tree group, we must exclude each country
+        if not territory.in_world_tree:
+            for t in territory.children:
+                self.exclude(t)
+            return
+
+        # Ok, so we must now do some calculations, lets create the stack
+        stack = []
+        for t in territory.ascendants:
+            stack.append(t)
+            if t in self.keys():
+                break
+        else:
+            raise ValueError(
+                f'Territory {territory} is not included, '
+                'so can not be excluded.')
+
+        # we remove the top level and add everything below the stack element,
+        # except elements in stack and the removed territory
+        top_level = stack[-1]
+        obj = self[top_level]
+        del self[top_level]
+        for parent in reversed(stack):
+            for t in parent.children:
+                if t not in stack and t != territory:
+                    self.include(t, obj)
+
+    def add(self, territory, obj=None):
+        """
+        Include a territory with its data to the list or add data to existing.
+
+        Args:
+            territory (Territory): territory object to be included
+            obj (any): Any object, used in code that uses this functionality
+        """
+
+        territory = self._clean_territory(territory)
+
+        # Territory already present as is, just add
+        if territory in self.keys():
+            self[territory] = self[territory] + obj
+            return
+
+        # Territory is not in world tree, e.g. Balkans, add all children
+        if not territory.in_world_tree:
+            for t in territory.children:
+                self.add(t, obj)
+            return
+
+        # If none of the above, splitting is necessary, so first split
+        # the appropriate children territories
+        keys = list(self.keys())
+        for t in keys:
+            if territory in t.descendants:
+                new_obj = self[t] + obj
+                self.exclude(territory)
+                self.include(territory, new_obj)
+                return
+
+        # Then try including the new territory, and add if already in there
+        try:
+            self.include(territory, obj)
+        except ValueError:
+            for t in territory.children:
+                self.add(t, obj)
+
+    @property
+    def countries(self):
+        countries = ReferenceTerritoryList()
+        for territory, obj in self.items():
+            if territory.is_country:
+                countries[territory] = obj
+            else:
+                for country in territory.countries:
+                    countries[country] = obj
+        return countries
+
+    def compress(self):
+        if len(self) <= 1:
+            return
+        ascendants = defaultdict(int)
+        for country, obj in self.countries.items():
+            for t in country.ascendants:
+                ascendants[(t, obj)] += 1
+        ascendants = OrderedDict(
+            sorted(ascendants.items(), key=lambda x: x[1], reverse=True))
+        solved = set()
+        for (territory, obj), count in ascendants.items():
+            if territory in solved:
+                continue
+            if len(list(territory.countries)) == count:
+                for country in territory.countries:
+                    self.exclude(country)
+                self.include(territory, obj)
+                for sub_territory in territory.descendants:
+                    if (sub_territory, obj) in ascendants.keys():
+                        solved.add(sub_territory)
+
+
+Outcome = collections.namedtuple('Outcome', ['errors', 'coverage'])
+
+
+class Report(object):
+    """
+    Result of comparing an engine with the reference implementation.
+    """
+
+    def __init__(self):
+        self.mismatches = []
+        self.operations = 0
+        self.errors = collections.Counter()
+        self.reference_seconds = 0.0
+        self.engine_seconds = 0.0
+
+    @staticmethod
+    def _throughput(seconds, operations):
+        return operations / seconds if seconds else float('inf')
+
+    @property
+    def reference_throughput(self):
+        """Operations per second in the reference implementation."""
+        return self._throughput(self.reference_seconds, self.operations)
+
+    @property
+    def engine_throughput(self):
+        """Operations per second in the compared engine."""
+        return self._throughput(self.engine_seconds, self.operations)
+
+
+def _code(rng, territory):
+    """
+    Return one of the codes of the territory, in random case.
+    """
+    code = rng.choice(
+        [territory.tis_n, territory.tis_a, territory.tis_a_ext or
+         territory.tis_a])
+    if rng.random() < 0.5:
+        code = code.lower()
+    return code
+
+
+def generate_operations(rng, length):
+    """
+    Generate a random sequence of operations over the territory registry.
+
+    Most sequences start by including World or a group in the world tree.
+    Territories for exclude and add are mostly drawn from those already
+    included and their descendants, or from groups outside the world tree,
+    so splitting and group expansion are exercised, not only the errors.
+
+    Territories are referenced by TIS-N, TIS-A or TIS-A-Ext codes, in
+    random case, so the cleaning of arguments is exercised as well.
+
+    Args:
+        rng (random.Random): random number generator
+        length (int): number of operations
+
+    Returns:
+        list of (operation, territory code, value) tuples
+    """
+    registry = Territory.registry
+    territories = list(registry.tis_n.values())
+    world_groups = [t for t in territories if t.children and t.in_world_tree]
+    other_groups = [
+        t for t in territories if t.children and not t.in_world_tree]
+    operations = []
+    covered = []
+
+    start = rng.random()
+    if start < 0.4:
+        territory = registry.get('2136')
+    elif start < 0.8:
+        territory = rng.choice(world_groups)
+    else:
+        territory = None
+    if territory is not None and length:
+        operations.append(
+            ('include', _code(rng, territory), rng.choice(VALUES[1:])))
+        covered.append(territory)
+        covered.extend(territory.descendants)
+
+    while len(operations) < length:
+        operation = rng.choices(OPERATIONS, WEIGHTS)[0]
+        draw = rng.random()
+        if covered and draw < 0.6:
+            territory = rng.choice(covered)
+        elif draw < 0.8:
+            territory = rng.choice(other_groups)
+        else:
+            territory = rng.choice(territories)
+        if operation in ('include', 'add'):
+            covered.append(territory)
+            covered.extend(territory.descendants)
+        operations.append(
+            (operation, _code(rng, territory), rng.choice(VALUES)))
+    return operations
+
+
+def run(engine, operations):
+    """
+    Run a sequence of operations on a new territory list.
+
+    Args:
+        engine (type): TerritoryList or a compatible class
+        operations (list): (operation, territory code, value) tuples
+
+    Returns:
+        Outcome with exception type and message, or None, for each
+        operation, and the final coverage, TIS-N codes of countries with
+        their values
+    """
+    territory_list = engine()
+    errors = []
+    for operation, code, value in operations:
+        try:
+            if operation == 'compress':
+                territory_list.compress()
+            elif operation == 'exclude':
+                territory_list.exclude(code)
+            else:
+                getattr(territory_list, operation)(code, value)
+        except Exception as e:
+            errors.append((type(e).__name__, str(e)))
+        else:
+            errors.append(None)
+    coverage = {
+        country.tis_n: obj
+        for country, obj in territory_list.countries.items()}
+    return Outcome(errors, coverage)
+
+
+def _timed_run(engine, operations):
+    start = time.perf_counter()
+    outcome = run(engine, operations)
+    return outcome, time.perf_counter() - start
+
+
+def compare(engine=TerritoryList, reference=ReferenceTerritoryList,
+            seeds=range(100), length=10):
+    """
+    Compare an engine with the reference implementation.
+
+    Args:
+        engine (type): TerritoryList or a compatible class
+        reference (type): class with the expected behaviour
+        seeds (iterable): seeds for random sequences, one sequence per seed
+        length (int): number of operations in a sequence
+
+    Returns:
+        Report
+    """
+    report = Report()
+    for seed in seeds:
+        operations = generate_operations(random.Random(seed), length)
+        expected, seconds = _timed_run(reference, operations)
+        report.reference_seconds += seconds
+        actual, seconds = _timed_run(engine, operations)
+        report.engine_seconds += seconds
+        report.operations += len(operations)
+        for (operation, __, __), error in zip(operations, expected.errors):
+            if error is not None:
+                report.errors[operation] += 1
+        if expected != actual:
+            report.mismatches.append((seed, operations, expected, actual))
+    return report
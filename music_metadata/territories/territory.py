@@ -9,28 +9,139 @@ They are then combined in different expressions, e.g.
 
 This should make things a bit simpler.
 
+Territories are published in immutable registry versions. Reading is
+lock-free, the current version is a single reference, and reloading builds
+a new version and swaps the reference, so readers never see a partially
+loaded registry. Territory objects are never modified once published.
+
 """
 
 import collections
 import csv
 import os
+import threading
 from datetime import datetime
+from types import MappingProxyType
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
 
 TERRITORY_LIST_FILE = 'list.csv'
 TERRITORY_TREE_FILE = 'tree.csv'
 
+# Orders of children, CSV is the order in the territory list
+ORDERS = ('csv', 'tis_n')
+
+
+def csv_key(territory):
+    """
+    Sort key for the CSV order, territories not in a registry go last.
+    """
+    if territory.ordinal is None:
+        return 1, int(territory.tis_n)
+    return 0, territory.ordinal
+
+
+def tis_n_key(territory):
+    """
+    Sort key for the TIS-N order.
+    """
+    return int(territory.tis_n)
+
+
+class Registry(collections.namedtuple('Registry', ['tis_n', 'tis_a'])):
+    """
+    Registry of territories by TIS-N and TIS-A codes.
 
-class Territory(object):
+    A registry is mutable only while being loaded, published registries
+    are frozen with read-only mappings.
+    """
+
+    @classmethod
+    def new(cls):
+        return cls(collections.OrderedDict(), collections.OrderedDict())
+
+    def register(self, territory):
+        """
+        Add a territory to a registry that is being loaded.
+
+        Args:
+            territory (Territory): territory object
+        """
+        territory.ordinal = len(self.tis_n)
+        self.tis_n[territory.tis_n] = territory
+        self.tis_a[territory.tis_a] = territory
+        if territory.tis_a_ext:
+            self.tis_a[territory.tis_a_ext] = territory
+
+    def freeze(self):
+        """
+        Return a read-only registry, and freeze the territories.
+
+        The mappings are wrapped in read-only views, not copied, so this
+        registry must not be changed afterwards. Children become tuples in
+        CSV order, all that can be sorted once is sorted here.
+
+        Returns:
+            Registry
+        """
+        for territory in self.tis_n.values():
+            territory.children_by_tis_n = tuple(
+                sorted(territory.children, key=tis_n_key))
+            territory.children = tuple(
+                sorted(territory.children, key=csv_key))
+        for territory in self.tis_n.values():
+            if territory.children:
+                territory.country_codes = tuple(
+                    sorted(t.tis_a for t in territory.countries))
+        return Registry(MappingProxyType(self.tis_n),
+                        MappingProxyType(self.tis_a))
+
+    def get(self, key):
+        """
+        Get the territory by one of the keys.
+
+        Args:
+            key (str): key value
+
+        Returns:
+            Territory
+        """
+        if key.isnumeric():
+            key = key.lstrip('0')
+            return self.tis_n.get(key)
+        else:
+            return self.tis_a.get(key.upper())
+
+
+class TerritoryType(type):
+    """
+    Metaclass of Territory, providing views of the current registry.
+    """
+
+    @property
+    def all_tis_n(cls):
+        return cls.registry.tis_n
+
+    @property
+    def all_tis_a(cls):
+        return cls.registry.tis_a
+
+
+class Territory(object, metaclass=TerritoryType):
     """
     Territory class contains CISAC TIS territories and their relations.
 
     Please note that variable names correspond to TIS, not the usual ones.
+
+    The current registry version is in ``Territory.registry``, use a single
+    reference to it for consistent reads. ``all_tis_n`` and ``all_tis_a``
+    are read-only views of the current version.
+
+    Territories are equal if their TIS-N codes are, so territories from
+    different registry versions can be used together.
     """
 
-    all_tis_n = collections.OrderedDict()
-    all_tis_a = collections.OrderedDict()
+    registry = Registry.new().freeze()
 
     def __init__(self, tis_n, tis_a, tis_a_ext, name, official_name,
                  abbreviated_name, typ):
@@ -52,13 +163,12 @@ class Territory(object):
         self.official_name = official_name
         self.abbreviated_name = abbreviated_name
         self.type = typ
+        self.ordinal = None
         self.parent = None
         self.children = set()
-
-        self.all_tis_n[self.tis_n] = self
-        self.all_tis_a[self.tis_a] = self
-        if self.tis_a_ext:
-            self.all_tis_a[self.tis_a_ext] = self
+        # set when frozen in a registry, computed on demand until then
+        self.children_by_tis_n = None
+        self.country_codes = None
 
     def __str__(self):
         return self.name
@@ -66,6 +176,16 @@ class Territory(object):
     def __repr__(self):
         return f'Territory: {self.name} ({self.type})'
 
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, Territory):
+            return NotImplemented
+        return self.tis_n == other.tis_n
+
+    def __hash__(self):
+        return hash(self.tis_n)
+
     @property
     def is_world(self):
         return self.tis_n == '2136'
@@ -95,11 +215,64 @@ class Territory(object):
         """
         if not isinstance(key, str):
             raise AttributeError('key must be of type str')
-        if key.isnumeric():
-            key = key.lstrip('0')
-            return cls.all_tis_n.get(key)
-        else:
-            return cls.all_tis_a.get(key.upper())
+        return cls.registry.get(key)
+
+    def get_children(self, order='csv'):
+        """
+        Return children in the chosen order.
+
+        Args:
+            order (str): 'csv' for the territory list order, or 'tis_n'
+
+        Returns:
+            tuple of Territory objects
+        """
+        if self.children_by_tis_n is not None:
+            if order == 'tis_n':
+                return self.children_by_tis_n
+            return self.children
+        key = tis_n_key if order == 'tis_n' else csv_key
+        return tuple(sorted(self.children, key=key))
+
+    def iter_descendants(self, order='csv', max_depth=None, types=None,
+                         only_countries=False):
+        """
+        Iterate over descendants, depth first, without recursion.
+
+        Groups come before their descendants, children in the chosen order.
+        Stopping early, e.g. with ``next`` or ``any``, skips the rest.
+
+        Args:
+            order (str): 'csv' for the territory list order, or 'tis_n'
+            max_depth (int): 1 for children only, None for no limit
+            types (iterable): territory types to be included, e.g. {'LND'}
+            only_countries (bool): Choose if you want only countries to be
+            included.
+
+        Returns:
+            generator of Territory objects
+        """
+        if order not in ORDERS:
+            raise ValueError(
+                f'Order must be one of: {", ".join(ORDERS)}.')
+        if max_depth is not None and max_depth < 1:
+            raise ValueError('Maximum depth must be at least 1.')
+        if types is not None:
+            types = frozenset(types)
+        stack = [iter(self.get_children(order))]
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+                continue
+            if child.children:
+                if not only_countries and (
+                        types is None or child.type in types):
+                    yield child
+                if max_depth is None or len(stack) < max_depth:
+                    stack.append(iter(child.get_children(order)))
+            elif types is None or child.type in types:
+                yield child
 
     def get_descendants(self, only_countries=False):
         """
@@ -113,13 +286,7 @@ class Territory(object):
             list of Territory objects
 
         """
-        for child in self.children:
-            if child.is_group:
-                if not only_countries:
-                    yield child
-                yield from child.get_descendants(only_countries=only_countries)
-            else:
-                yield child
+        return self.iter_descendants(only_countries=only_countries)
 
     @property
     def descendants(self):
@@ -129,7 +296,7 @@ class Territory(object):
         Returns:
             list of Territory objects
         """
-        yield from self.get_descendants()
+        return self.iter_descendants()
 
     @property
     def countries(self):
@@ -139,16 +306,17 @@ class Territory(object):
         Returns:
             list of Territory objects
         """
-        yield from self.get_descendants(only_countries=True)
+        return self.iter_descendants(only_countries=True)
 
     def get_ascendants(self):
-        if self.parent:
-            yield self.parent
-            yield from self.parent.get_ascendants()
+        parent = self.parent
+        while parent:
+            yield parent
+            parent = parent.parent
 
     @property
     def ascendants(self):
-        yield from self.get_ascendants()
+        return self.get_ascendants()
 
     def to_dict(self, verbosity=1):
         d = collections.OrderedDict()
@@ -159,14 +327,19 @@ class Territory(object):
         if verbosity >= 1:
             d['type'] = self.type
             if self.children and verbosity >= 2:
-                d['included_tis-a_country_codes'] = sorted([
-                    t.tis_a for t in self.countries])
+                codes = self.country_codes
+                if codes is None:
+                    codes = sorted(t.tis_a for t in self.countries)
+                d['included_tis-a_country_codes'] = list(codes)
         return d
 
 
-def import_territories():
+def import_territories(registry):
     """
     Import territories from a CSV file.
+
+    Args:
+        registry (Registry): registry being loaded
     """
 
     now = datetime.now()
@@ -188,11 +361,12 @@ def import_territories():
             if not (frm <= now <= until and frm2 <= now <= until2):
                 continue
 
-            Territory(tis_n, tis_a, tis_a_ext, name, official_name,
-                      abbreviated_name, typ)
+            registry.register(Territory(
+                tis_n, tis_a, tis_a_ext, name, official_name,
+                abbreviated_name, typ))
 
 
-def get_territory_level_type(row, moment):
+def get_territory_level_type(row, moment, registry):
     level, tis_n, __, __, typ, __, __, frm, till, __ = row
 
     frm = datetime.strptime(frm, '%d.%m.%Y') if frm else None
@@ -200,15 +374,18 @@ def get_territory_level_type(row, moment):
     if frm and till and not frm <= moment <= till:
         return None, None, None
 
-    return Territory.get(tis_n), level, typ
+    return registry.get(tis_n), level, typ
 
 
-def import_world_tree():
+def import_world_tree(registry):
     """
     Import the territory structure, world-tree only.
 
     This import is partial, as it allows only the world tree, and what it
     includes.
+
+    Args:
+        registry (Registry): registry being loaded
     """
 
     now = datetime.now()
@@ -221,7 +398,8 @@ def import_world_tree():
         reader = csv.reader(list_file)
         next(reader)
         for row in reader:
-            territory, level, typ = get_territory_level_type(row, now)
+            territory, level, typ = get_territory_level_type(
+                row, now, registry)
             if territory is None:
                 continue
 
@@ -261,12 +439,12 @@ def reduce_stack_to_level(stack, level):
     return stack
 
 
-def process_reader(reader):
+def process_reader(reader, registry):
     now = datetime.now()
     stack = []
     world = False
     for row in reader:
-        territory, level, typ = get_territory_level_type(row, now)
+        territory, level, typ = get_territory_level_type(row, now, registry)
         if territory is None:
             continue
 
@@ -291,12 +469,15 @@ def process_reader(reader):
             add_child_to_stack(stack, territory)
 
 
-def import_other_structure():
+def import_other_structure(registry):
     """
     Import the territory structure.
 
     This is the second part of the import, where everything in the world-tree
     is ignored.
+
+    Args:
+        registry (Registry): registry being loaded
     """
 
     with open(
@@ -305,9 +486,42 @@ def import_other_structure():
     ) as list_file:
         reader = csv.reader(list_file)
         next(reader)
-        process_reader(reader)
+        process_reader(reader, registry)
+
+
+def load_registry():
+    """
+    Load a new registry version from CSV files.
+
+    Returns:
+        Registry, frozen
+    """
+    registry = Registry.new()
+    import_territories(registry)
+    import_world_tree(registry)
+    import_other_structure(registry)
+    return registry.freeze()
+
+
+_reload_lock = threading.Lock()
+
+
+def reload_territories():
+    """
+    Load territories and publish them as the current registry version.
+
+    Readers are never blocked, they see either the previous or the new
+    version. Territory objects, and territory lists containing them, from
+    the previous version remain valid, and equal to their counterparts in
+    the new version.
+
+    Returns:
+        Registry
+    """
+    with _reload_lock:
+        registry = load_registry()
+        Territory.registry = registry
+    return registry
 
 
-import_territories()
-import_world_tree()
-import_other_structure()
+reload_territories()
@@ -30,6 +30,53 @@ class TerritoryList(collections.OrderedDict):
             return True
         return False
 
+    def _get_including(self, territory):
+        """
+        Return the key that includes the territory through descendants.
+
+        Args:
+            territory (Territory): territory object
+
+        Returns:
+            Territory or None
+        """
+        for t in territory.ascendants:
+            if t in self.keys():
+                return t
+        return None
+
+    def _split(self, territory):
+        """
+        Replace the key including the territory with the rest of its tree.
+
+        Args:
+            territory (Territory): territory object to be split out
+        """
+
+        # Ok, so we must now do some calculations, lets create the stack
+        stack = []
+        for t in territory.ascendants:
+            stack.append(t)
+            if t in self.keys():
+                break
+        else:
+            raise ValueError(
+                f'Territory {territory} is not included, '
+                'so can not be excluded.')
+
+        # we remove the top level and add everything below the stack element,
+        # except elements in stack and the removed territory, none of them
+        # can be in the list already, so there is no need to check
+        top_level = stack[-1]
+        obj = self.pop(top_level)
+        path = [territory] + stack
+        for i in reversed(range(len(stack))):
+            # all in the same tree, so identity is enough
+            on_path = path[i]
+            for t in stack[i].children:
+                if t is not on_path:
+                    self[t] = obj
+
     def include(self, territory, obj=None):
         """
         Include a territory with its data to the list.
@@ -47,15 +94,14 @@ class TerritoryList(collections.OrderedDict):
 
         if territory.children and not territory.in_world_tree:
             # This is some group not in the world tree:
-            for t in territory.children:
-                self.include(t, obj)
+            self._include_group(territory, obj)
             return
 
-        for t in self:
-            if territory in t.descendants:
-                raise ValueError(
-                    f'Territory {territory} is already included through '
-                    f'{t}.')
+        t = self._get_including(territory)
+        if t is not None:
+            raise ValueError(
+                f'Territory {territory} is already included through '
+                f'{t}.')
 
         for t in self:
             if territory in t.ascendants:
@@ -65,6 +111,33 @@ class TerritoryList(collections.OrderedDict):
 
         self[territory] = obj
 
+    def _include_group(self, group, obj):
+        """
+        Include all countries of a group not in the world tree at once.
+
+        Countries before the first one that can not be included remain
+        included, same as if they were included one by one.
+
+        Args:
+            group (Territory): territory object not in the world tree
+            obj (any): Any object, used in code that uses this functionality
+        """
+
+        included = OrderedDict()
+        try:
+            for t in group.children:
+                if t in self.keys():
+                    raise ValueError(
+                        f'Territory {t} is already directly included.')
+                parent = self._get_including(t)
+                if parent is not None:
+                    raise ValueError(
+                        f'Territory {t} is already included through '
+                        f'{parent}.')
+                included[t] = obj
+        finally:
+            self.update(included)
+
     def exclude(self, territory):
         """
         Smartly exclude the territory from the list
@@ -82,30 +155,24 @@ class TerritoryList(collections.OrderedDict):
 
         # If it is some non-world-tree group, we must exclude each country
         if not territory.in_world_tree:
-            for t in territory.children:
-                self.exclude(t)
+            self._exclude_group(territory)
             return
 
-        # Ok, so we must now do some calculations, lets create the stack
-        stack = []
-        for t in territory.ascendants:
-            stack.append(t)
-            if t in self.keys():
-                break
-        else:
-            raise ValueError(
-                f'Territory {territory} is not included, '
-                'so can not be excluded.')
+        self._split(territory)
 
-        # we remove the top level and add everything below the stack element,
-        # except elements in stack and the removed territory
-        top_level = stack[-1]
-        obj = self[top_level]
-        del self[top_level]
-        for parent in reversed(stack):
-            for t in parent.children:
-                if t not in stack and t != territory:
-                    self.include(t, obj)
+    def _exclude_group(self, group):
+        """
+        Exclude all countries of a group not in the world tree at once.
+
+        Args:
+            group (Territory): territory object not in the world tree
+        """
+
+        for t in group.children:
+            if t in self.keys():
+                del self[t]
+            elif t.in_world_tree:
+                self._split(t)
 
     def add(self, territory, obj=None):
         """
@@ -125,19 +192,17 @@ class TerritoryList(collections.OrderedDict):
 
         # Territory is not in world tree, e.g. Balkans, add all children
         if not territory.in_world_tree:
-            for t in territory.children:
-                self.add(t, obj)
+            self._add_group(territory, obj)
             return
 
         # If none of the above, splitting is necessary, so first split
         # the appropriate children territories
-        keys = list(self.keys())
-        for t in keys:
-            if territory in t.descendants:
-                new_obj = self[t] + obj
-                self.exclude(territory)
-                self.include(territory, new_obj)
-                return
+        t = self._get_including(territory)
+        if t is not None:
+            new_obj = self[t] + obj
+            self._split(territory)
+            self[territory] = new_obj
+            return
 
         # Then try including the new territory, and add if already in there
         try:
@@ -146,6 +211,27 @@ class TerritoryList(collections.OrderedDict):
             for t in territory.children:
                 self.add(t, obj)
 
+    def _add_group(self, group, obj):
+        """
+        Add data to all countries of a group not in the world tree at once.
+
+        Args:
+            group (Territory): territory object not in the world tree
+            obj (any): Any object, used in code that uses this functionality
+        """
+
+        for t in group.children:
+            if t in self.keys():
+                self[t] = self[t] + obj
+            elif t.in_world_tree:
+                parent = self._get_including(t)
+                if parent is None:
+                    self[t] = obj
+                else:
+                    new_obj = self[parent] + obj
+                    self._split(t)
+                    self[t] = new_obj
+
     @property
     def countries(self):
         countries = TerritoryList()
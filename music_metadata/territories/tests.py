@@ -1,6 +1,11 @@
+import collections
+import random
+import threading
 import unittest
 
-from music_metadata.territories.territory import Territory
+from music_metadata.territories import columnar, differential
+from music_metadata.territories.territory import (
+    Territory, reload_territories)
 from music_metadata.territories.territory_list import TerritoryList
 
 
@@ -58,6 +63,155 @@ class TestTerritory(unittest.TestCase):
         for c in cat.countries:
             self.assertIn(c, world.countries)
 
+    def test_traversal(self):
+        """
+        Test iterative traversal with ordering, depth and type filters.
+        """
+        world = Territory.get('2136')
+        europe = Territory.get('2120')
+
+        def recursive(territory):
+            for child in territory.children:
+                yield child
+                yield from recursive(child)
+
+        descendants = list(world.descendants)
+        self.assertEqual(descendants, list(recursive(world)))
+        self.assertEqual(descendants, list(world.iter_descendants()))
+        self.assertEqual(
+            list(world.countries),
+            [t for t in descendants if t.is_country])
+
+        children = list(world.iter_descendants(max_depth=1))
+        self.assertEqual(children, list(world.children))
+        self.assertEqual(
+            children, sorted(children, key=lambda t: t.ordinal))
+        children = list(world.iter_descendants(order='tis_n', max_depth=1))
+        self.assertEqual(
+            [t.tis_n for t in children],
+            ['2100', '2101', '2106', '2120', '2130'])
+        self.assertEqual(
+            set(world.iter_descendants(order='tis_n')), set(descendants))
+        with self.assertRaises(ValueError):
+            list(world.iter_descendants(order='name'))
+        for max_depth in [0, -1]:
+            with self.assertRaises(ValueError):
+                list(world.iter_descendants(max_depth=max_depth))
+
+        self.assertNotIn(
+            Territory.get('HR'), world.iter_descendants(max_depth=2))
+        self.assertEqual(
+            set(world.iter_descendants(types={'LND'})),
+            set(world.countries))
+        self.assertEqual(
+            set(t.type for t in europe.iter_descendants(types=['GLG'])),
+            {'GLG'})
+        self.assertEqual(
+            next(world.iter_descendants(only_countries=True)),
+            next(world.countries))
+
+        codes = europe.to_dict(2)['included_tis-a_country_codes']
+        self.assertEqual(codes, sorted(t.tis_a for t in europe.countries))
+        self.assertEqual(
+            codes, europe.to_dict(2)['included_tis-a_country_codes'])
+
+        # Territories not frozen in a registry
+        group = Territory('9999', '2XX', '', 'GROUP', '', '', 'GLG')
+        for tis_n, tis_a in [('20', 'AD'), ('8', 'AL')]:
+            child = Territory(tis_n, tis_a, '', tis_a, '', '', 'LND')
+            child.parent = group
+            group.children.add(child)
+        self.assertEqual(
+            [t.tis_n for t in group.iter_descendants(order='tis_n')],
+            ['8', '20'])
+        self.assertEqual(
+            group.to_dict(2)['included_tis-a_country_codes'], ['AD', 'AL'])
+
+
+class TestRegistry(unittest.TestCase):
+
+    def test_reload(self):
+        """
+        Test that reloading publishes a new, immutable registry version.
+        """
+        old = Territory.registry
+        old_croatia = Territory.get('HR')
+        with self.assertRaises(TypeError):
+            old.tis_a['XX'] = old_croatia
+        with self.assertRaises(AttributeError):
+            old_croatia.children.add(old_croatia)
+
+        new = reload_territories()
+        self.assertIs(Territory.registry, new)
+        self.assertIs(Territory.all_tis_n, new.tis_n)
+        self.assertIs(Territory.all_tis_a, new.tis_a)
+        self.assertIsNot(Territory.get('HR'), old_croatia)
+        self.assertEqual(list(new.tis_n), list(old.tis_n))
+
+        # the old version remains consistent
+        self.assertIs(old.get('191'), old_croatia)
+        self.assertIn(old_croatia, old.get('2136').countries)
+        self.assertEqual(Territory.get('HR'), old_croatia)
+        self.assertEqual(hash(Territory.get('HR')), hash(old_croatia))
+        self.assertNotEqual(Territory.get('SI'), old_croatia)
+
+    def test_reload_lists(self):
+        """
+        Test that lists built before a reload keep working after it.
+        """
+        old_croatia = Territory.get('HR')
+        cached = TerritoryList()
+        cached.include('2136', 10)
+        values = TerritoryList()
+        values.include('2120', 10)
+        values.exclude(old_croatia)
+        values.include(old_croatia, 5)
+        reload_territories()
+
+        self.assertIn('HR', cached)
+        self.assertIn(Territory.get('HR'), cached)
+        cached.exclude('HR')
+        self.assertNotIn('HR', cached)
+        self.assertIn('SI', cached)
+        cached.add('SI', 5)
+        self.assertEqual(cached.countries[Territory.get('SI')], 15)
+        cached.include('HR', 20)
+        self.assertEqual(cached.countries[old_croatia], 20)
+
+        with self.assertRaises(ValueError):
+            values.include('HR')
+        values.add('HR', 5)
+        self.assertEqual(values[Territory.get('HR')], 10)
+        values.exclude('HR')
+        self.assertNotIn('HR', values)
+        self.assertIn('SI', values)
+
+    def test_concurrent_reads(self):
+        """
+        Test that readers see consistent versions during reloads.
+        """
+        stop = threading.Event()
+        torn = []
+
+        def read():
+            while not stop.is_set():
+                registry = Territory.registry
+                croatia = registry.get('HR')
+                if croatia is not registry.get('191') or (
+                        list(croatia.ascendants)[-1] is not
+                        registry.get('2136')):
+                    torn.append(croatia)
+
+        readers = [threading.Thread(target=read) for __ in range(2)]
+        for reader in readers:
+            reader.start()
+        for __ in range(2):
+            reload_territories()
+        stop.set()
+        for reader in readers:
+            reader.join()
+        self.assertEqual(torn, [])
+
 
 class TestTerritoryList(unittest.TestCase):
 
@@ -234,3 +388,226 @@ class TestTerritoryList(unittest.TestCase):
         t.compress()
         self.assertEqual(t.get(bt), 75)
         self.assertEqual(t.get(uk), None)
+
+    def test_groups(self):
+        """
+        Test groups not in the world tree, e.g. Commonwealth.
+        """
+
+        commonwealth = Territory.get('2114')
+        croatia = Territory.get('HR')
+        uk = Territory.get('GB')
+
+        territory_list = TerritoryList()
+        territory_list.include(commonwealth, 10)
+        self.assertEqual(
+            set(territory_list.keys()), set(commonwealth.children))
+        territory_list.add(commonwealth, 5)
+        self.assertEqual(set(territory_list.values()), {15})
+        territory_list.exclude(commonwealth)
+        self.assertEqual(len(territory_list), 0)
+
+        # Members before the first failing one remain included
+        territory_list = TerritoryList()
+        territory_list.include(uk)
+        with self.assertRaises(ValueError):
+            territory_list.include(commonwealth)
+        members = list(commonwealth.children)
+        included = members[:members.index(uk)] + [uk]
+        self.assertEqual(set(territory_list.keys()), set(included))
+
+        # Splitting the world
+        territory_list = TerritoryList()
+        territory_list.add('2136', 10)
+        territory_list.add(commonwealth, 10)
+        self.assertEqual(territory_list.countries[uk], 20)
+        self.assertEqual(territory_list.countries[croatia], 10)
+        territory_list.exclude(commonwealth)
+        self.assertNotIn(uk, territory_list)
+        self.assertIn(croatia, territory_list)
+        territory_list.include(commonwealth, 30)
+        self.assertEqual(territory_list.countries[uk], 30)
+        territory_list.compress()
+        self.assertIn(uk, territory_list.keys())
+
+        # Excluding a group that is only partially included fails
+        territory_list = TerritoryList()
+        territory_list.include('2120')
+        with self.assertRaises(ValueError):
+            territory_list.exclude(commonwealth)
+
+
+class TestDifferential(unittest.TestCase):
+
+    def test_reference(self):
+        """
+        Test that TerritoryList behaves exactly as the reference.
+        """
+        report = differential.compare(seeds=range(200), length=10)
+        self.assertEqual(report.mismatches, [])
+        self.assertEqual(report.operations, 2000)
+        self.assertGreater(report.engine_throughput, 0)
+
+    def test_paths(self):
+        """
+        Test that generated operations reach splitting and group paths.
+        """
+        calls = collections.Counter()
+
+        class CountingTerritoryList(TerritoryList):
+            def _split(self, territory):
+                calls['split'] += 1
+                return super()._split(territory)
+
+            def _include_group(self, group, obj):
+                calls['include_group'] += 1
+                return super()._include_group(group, obj)
+
+            def _exclude_group(self, group):
+                calls['exclude_group'] += 1
+                return super()._exclude_group(group)
+
+            def _add_group(self, group, obj):
+                calls['add_group'] += 1
+                return super()._add_group(group, obj)
+
+        report = differential.compare(
+            CountingTerritoryList, seeds=range(200), length=10)
+        self.assertEqual(report.mismatches, [])
+        for path in ['include_group', 'exclude_group', 'add_group']:
+            self.assertGreater(calls[path], 20)
+        self.assertGreater(calls['split'], 200)
+
+        # most excludes do not fail straight away
+        excludes = sum(
+            operation == 'exclude'
+            for seed in range(200)
+            for operation, __, __ in differential.generate_operations(
+                random.Random(seed), 10))
+        self.assertLess(report.errors['exclude'], excludes / 2)
+
+    def test_broken_engine(self):
+        """
+        Test that differences are detected.
+        """
+
+        class BrokenTerritoryList(TerritoryList):
+            def exclude(self, territory):
+                pass
+
+        report = differential.compare(
+            BrokenTerritoryList, seeds=range(20), length=10)
+        self.assertTrue(report.mismatches)
+
+
+def _module_available(name):
+    try:
+        __import__(name)
+    except ImportError:
+        return False
+    return True
+
+
+class TestColumnar(unittest.TestCase):
+
+    def get_lists(self):
+        world_without_us = TerritoryList()
+        world_without_us.include('2136', 25)
+        world_without_us.exclude('US')
+        balkans = TerritoryList()
+        balkans.include('2108', 50)
+        balkans.include('US', 75)
+        return [world_without_us, TerritoryList(), balkans]
+
+    def test_chunks(self):
+        """
+        Test that chunks are bounded and match the expanded countries.
+        """
+        lists = self.get_lists()
+        chunks = list(columnar.iter_chunks(iter(lists), chunk_size=100))
+        self.assertTrue(all(len(c['tis_a']) <= 100 for c in chunks))
+        self.assertEqual(len(chunks[0]['tis_a']), 100)
+
+        rows = []
+        for chunk in chunks:
+            self.assertEqual(set(chunk.keys()), set(columnar.COLUMNS))
+            rows.extend(zip(*(chunk[c] for c in columnar.COLUMNS)))
+        expected = []
+        for list_id, territory_list in enumerate(lists):
+            for country, obj in territory_list.countries.items():
+                expected.append((
+                    list_id, list(Territory.all_tis_n).index(country.tis_n),
+                    int(country.tis_n), country.tis_a, obj))
+        self.assertEqual(rows, expected)
+
+        self.assertEqual(list(columnar.iter_chunks([])), [])
+        with self.assertRaises(ValueError):
+            list(columnar.iter_chunks(lists, chunk_size=0))
+
+    @unittest.skipUnless(_module_available('numpy'), 'requires numpy')
+    def test_numpy(self):
+        lists = self.get_lists()
+        chunks = list(columnar.iter_numpy_chunks(lists, chunk_size=100))
+        self.assertEqual(
+            sum(len(c['list_id']) for c in chunks),
+            sum(len(t.countries) for t in lists))
+        last = chunks[-1]
+        self.assertEqual(last['list_id'][-1], 2)
+        self.assertEqual(last['tis_n'][-1], 840)
+        self.assertEqual(last['tis_a'][-1], 'US')
+        self.assertEqual(last['value'][-1], 75)
+        self.assertEqual(last['value'].dtype, object)
+
+        # Sequence values remain one per row, whatever their length
+        for values in [((1, 2), (3, 4)), ((1, 2), (3, 4, 5))]:
+            lists = []
+            for code, value in zip(['HR', 'SI'], values):
+                territory_list = TerritoryList()
+                territory_list.include(code, value)
+                lists.append(territory_list)
+            chunk = next(columnar.iter_numpy_chunks(lists))
+            self.assertEqual(chunk['value'].shape, (2,))
+            self.assertEqual(tuple(chunk['value']), values)
+
+        chunk = next(columnar.iter_numpy_chunks(
+            lists[:1], value_dtype=float))
+        self.assertEqual(chunk['value'].dtype, float)
+
+    @unittest.skipUnless(_module_available('pyarrow'), 'requires pyarrow')
+    def test_arrow(self):
+        lists = self.get_lists()
+        table = columnar.to_arrow_table(lists, chunk_size=100)
+        self.assertEqual(table.column_names, list(columnar.COLUMNS))
+        self.assertEqual(
+            table.num_rows, sum(len(t.countries) for t in lists))
+        self.assertEqual(
+            table.column('tis_a').to_pylist().count('US'), 1)
+        self.assertEqual(columnar.to_arrow_table([]).num_rows, 0)
+
+        # Batches with only None values get the type of the others
+        import pyarrow
+        without_values = TerritoryList()
+        without_values.include('HR')
+        with_values = TerritoryList()
+        with_values.include('SI', 25)
+        table = columnar.to_arrow_table(
+            [without_values, with_values], chunk_size=1)
+        self.assertEqual(table.column('value').type, pyarrow.int64())
+        self.assertEqual(table.column('value').to_pylist(), [None, 25])
+        table = columnar.to_arrow_table(
+            [without_values], value_type=pyarrow.float64())
+        self.assertEqual(table.column('value').type, pyarrow.float64())
+        batches = columnar.iter_record_batches(
+            [without_values, with_values], chunk_size=1,
+            value_type=pyarrow.int64())
+        self.assertEqual(
+            set(b.schema.field('value').type for b in batches),
+            {pyarrow.int64()})
+        self.assertEqual(
+            columnar.to_arrow_table([], value_type=pyarrow.int64()).schema
+            .field('value').type, pyarrow.int64())
+        with_text = TerritoryList()
+        with_text.include('AT', 'text')
+        with self.assertRaises(ValueError):
+            columnar.to_arrow_table(
+                [with_values, with_text], chunk_size=1)